@@ -2,11 +2,15 @@
 Alert Generation System
 Creates actionable alerts from detected anomalies
 """
-import json
 import logging
+import os
+import sys
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+import numpy as np
+import orjson
 import pandas as pd
 from opentelemetry import trace
 
@@ -24,23 +28,64 @@ class AlertGenerator:
     - Summary statistics
     """
     
+    # Severity levels, most severe first
+    SEVERITIES = ("CRITICAL", "HIGH", "MEDIUM", "LOW")
+    
+    # Console markers per severity level
+    SEVERITY_EMOJI = {
+        "CRITICAL": "🔴",
+        "HIGH": "🟠",
+        "MEDIUM": "🟡",
+        "LOW": "🟢"
+    }
+    
+    # Recommendation templates per severity level
+    RECOMMENDATIONS = {
+        "CRITICAL": "⚠️  IMMEDIATE ACTION REQUIRED: Investigate {service} cost spike of ${cost:.2f}. Check for unauthorized usage, misconfigurations, or runaway processes.",
+        "HIGH": "⚡ HIGH PRIORITY: Review {service} costs. Verify this usage was planned. Consider setting up cost alerts and budget limits.",
+        "MEDIUM": "📊 REVIEW RECOMMENDED: Monitor {service} for continued elevated costs. Document if this is expected seasonal variation.",
+        "LOW": "ℹ️  FYI: Slight variation in {service} costs detected. No immediate action required but keep monitoring."
+    }
+    
+    # Detection flag columns and their display names
+    DETECTION_METHODS = {
+        'if_anomaly': "Isolation Forest",
+        'zscore_anomaly': "Z-Score",
+        'iqr_anomaly': "IQR",
+        'service_anomaly': "Service-Level"
+    }
+    
+    # Detection result columns read when building alerts
+    SOURCE_COLUMNS = (
+        'date', 'service_name', 'cost_usd', 'confidence', 'anomaly_score',
+        'zscore', 'if_score', 'iqr_lower', 'iqr_upper', *DETECTION_METHODS
+    )
+    
+    # orjson options for reports; numpy scalars are serialized natively
+    JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    NDJSON_OPTIONS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    
+    # Supported save modes: per-run JSON report, or daily append-only NDJSON
+    SAVE_MODES = ('report', 'batch')
+    
     def __init__(self, output_dir: str = "alerts"):
         """
         Initialize alert generator
         
         Args:
-            output_dir: Directory to save alert reports
+            output_dir: Directory to save alert reports (created on first save)
         """
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(exist_ok=True)
-        logger.info(f"📢 Alert Generator initialized")
-        logger.info(f"   Output directory: {self.output_dir}")
+        logger.info("📢 Alert Generator initialized")
+        logger.info("   Output directory: %s", self.output_dir)
     
     def generate_alerts(
         self,
         data: pd.DataFrame,
         summary: Dict,
-        save_to_file: bool = True
+        save_to_file: bool = True,
+        save_mode: str = 'report',
+        avg_cost: Optional[float] = None
     ) -> List[Dict]:
         """
         Generate alerts from anomaly detection results
@@ -48,237 +93,332 @@ class AlertGenerator:
         Args:
             data: DataFrame with detection results
             summary: Summary statistics from detector
-            save_to_file: Whether to save alerts to JSON file
+            save_to_file: Whether to save alerts to file
+            save_mode: 'report' for one indented JSON file per run, or
+                'batch' to append to the daily NDJSON file
+            avg_cost: Average cost of the analyzed data, if already known
+                (e.g. from CostDataLoader.get_summary_stats); computed from
+                `data` when omitted
             
         Returns:
             List of alert dictionaries
         """
         with tracer.start_as_current_span("generate_alerts") as span:
             try:
-                logger.info(f"📢 Generating alerts...")
+                logger.info("📢 Generating alerts...")
+                
+                if save_mode not in self.SAVE_MODES:
+                    raise ValueError(
+                        f"Unknown save_mode: {save_mode!r}. "
+                        f"Expected one of: {', '.join(self.SAVE_MODES)}"
+                    )
                 
                 if 'is_anomaly' not in data.columns:
                     logger.warning("⚠️  No anomaly detection results found")
                     return []
                 
-                anomalies = data[data['is_anomaly']].copy()
+                # Select anomaly rows and only the columns alerts read; alert
+                # building never mutates this subset, so no extra copy
+                mask = data['is_anomaly'].to_numpy(dtype=bool)
+                columns = [col for col in self.SOURCE_COLUMNS if col in data.columns]
+                anomalies = data.loc[mask, columns]
                 
                 if len(anomalies) == 0:
                     logger.info("✅ No anomalies detected - all costs within normal range!")
                     span.set_attribute("alerts.count", 0)
                     return []
                 
-                # Generate alerts
-                alerts = []
-                for idx, row in anomalies.iterrows():
-                    alert = self._create_alert(row, data)
-                    alerts.append(alert)
+                # Baseline cost for deviation, computed once per run unless supplied
+                if avg_cost is None:
+                    avg_cost = float(data['cost_usd'].mean()) if 'cost_usd' in data.columns else 0.0
+                
+                # One clock read per run, shared by alert ids, display and report
+                now = datetime.now()
                 
-                # Sort by severity
-                alerts.sort(key=lambda x: x['severity_score'], reverse=True)
+                # Generate alerts, ordered by severity
+                alerts = self._build_alerts(anomalies, avg_cost, now)
+                
+                # Count severities once, shared by span, display and report
+                severity_counts = Counter(a['severity'] for a in alerts)
                 
                 span.set_attribute("alerts.count", len(alerts))
-                span.set_attribute("alerts.critical", sum(1 for a in alerts if a['severity'] == 'CRITICAL'))
-                span.set_attribute("alerts.high", sum(1 for a in alerts if a['severity'] == 'HIGH'))
+                span.set_attribute("alerts.critical", severity_counts['CRITICAL'])
+                span.set_attribute("alerts.high", severity_counts['HIGH'])
                 
                 # Display alerts
-                self._display_alerts(alerts, summary)
+                self._display_alerts(alerts, summary, severity_counts, now)
                 
                 # Save to file
                 if save_to_file:
-                    self._save_alerts(alerts, summary)
+                    self._save_alerts(alerts, summary, severity_counts, now, save_mode)
                 
-                logger.info(f"✅ Generated {len(alerts)} alerts")
+                logger.info("✅ Generated %d alerts", len(alerts))
                 
                 return alerts
                 
             except Exception as e:
-                logger.error(f"❌ Alert generation failed: {e}")
+                logger.error("❌ Alert generation failed: %s", e)
                 span.set_attribute("error", True)
                 span.set_attribute("error.message", str(e))
                 raise
     
-    def _create_alert(self, row: pd.Series, full_data: pd.DataFrame) -> Dict:
+    def _build_alerts(self, anomalies: pd.DataFrame, avg_cost: float, now: datetime) -> List[Dict]:
         """
-        Create a structured alert from an anomaly
+        Create structured alerts for all anomalies in one vectorized pass,
+        ordered by severity score (highest first)
         
         Args:
-            row: Anomaly row from detection results
-            full_data: Full dataset for context
+            anomalies: Anomaly rows from detection results
+            avg_cost: Average cost across the full dataset
+            now: Generation time used for alert ids and timestamps
             
         Returns:
-            Alert dictionary
+            List of alert dictionaries
         """
-        # Calculate severity
-        cost = row.get('cost_usd', 0)
-        confidence = row.get('confidence', 0)
-        anomaly_score = row.get('anomaly_score', 0)
+        # Cast each numeric column once, so the serialized schema stays
+        # float/int regardless of the input dtypes
+        confidence = self._column(anomalies, 'confidence', 0.0).astype(float)
+        anomaly_score = self._column(anomalies, 'anomaly_score', 0).astype(int)
         
         # Severity calculation
         severity_score = confidence * anomaly_score
         
-        if severity_score >= 3.0:
-            severity = "CRITICAL"
-        elif severity_score >= 2.0:
-            severity = "HIGH"
-        elif severity_score >= 1.0:
-            severity = "MEDIUM"
-        else:
-            severity = "LOW"
+        # Order rows by severity once (stable, so ties keep detection order)
+        order = np.argsort(-severity_score, kind='stable')
+        anomalies = anomalies.iloc[order]
+        confidence = confidence[order]
+        anomaly_score = anomaly_score[order]
+        severity_score = severity_score[order]
+        
+        # Pull every other needed column once as a positional array
+        cost = self._column(anomalies, 'cost_usd', 0.0).astype(float)
+        service = self._column(anomalies, 'service_name', 'Unknown').astype(str)
+        # str() per value keeps the Timestamp format ('2025-01-10 00:00:00');
+        # Series.astype(str) drops midnight times when every value has one
+        dates = [str(d) for d in anomalies['date']] if 'date' in anomalies.columns else ''
+        
+        severity = np.select(
+            [severity_score >= 3.0, severity_score >= 2.0, severity_score >= 1.0],
+            ["CRITICAL", "HIGH", "MEDIUM"],
+            default="LOW"
+        )
         
         # Calculate deviation from normal
-        avg_cost = full_data['cost_usd'].mean() if 'cost_usd' in full_data.columns else 0
-        deviation_pct = ((cost - avg_cost) / avg_cost * 100) if avg_cost > 0 else 0
+        if avg_cost > 0:
+            deviation_pct = (cost - avg_cost) / avg_cost * 100
+        else:
+            deviation_pct = np.zeros(len(anomalies))
         
-        # Detection methods that flagged this
-        methods = []
-        if row.get('if_anomaly', False):
-            methods.append("Isolation Forest")
-        if row.get('zscore_anomaly', False):
-            methods.append("Z-Score")
-        if row.get('iqr_anomaly', False):
-            methods.append("IQR")
-        if row.get('service_anomaly', False):
-            methods.append("Service-Level")
+        # Detection methods that flagged each anomaly
+        method_names = np.array(list(self.DETECTION_METHODS.values()))
+        flags = np.column_stack([
+            self._column(anomalies, col, False).astype(bool)
+            for col in self.DETECTION_METHODS
+        ])
+        methods = [method_names[row].tolist() for row in flags]
         
-        alert = {
-            "alert_id": f"ALERT-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{row.name}",
-            "timestamp": datetime.now().isoformat(),
-            "severity": severity,
-            "severity_score": float(severity_score),
-            "date": str(row.get('date', '')),
-            "service": row.get('service_name', 'Unknown'),
-            "cost_usd": float(cost),
-            "average_cost": float(avg_cost),
-            "deviation_pct": float(deviation_pct),
-            "confidence": float(confidence),
-            "detection_methods": methods,
-            "details": {
-                "anomaly_score": int(anomaly_score),
-                "zscore": float(row.get('zscore', 0)),
-                "if_score": float(row.get('if_score', 0)),
-                "iqr_lower": float(row.get('iqr_lower', 0)),
-                "iqr_upper": float(row.get('iqr_upper', 0))
-            },
-            "recommendation": self._get_recommendation(severity, row)
-        }
+        # Actionable recommendation per alert, from the severity's template
+        templates = self.RECOMMENDATIONS
+        recommendations = [
+            templates[sev].format(service=svc, cost=c)
+            for sev, svc, c in zip(severity, service, cost)
+        ]
         
-        return alert
-    
-    def _get_recommendation(self, severity: str, row: pd.Series) -> str:
-        """Generate actionable recommendation based on severity"""
-        service = row.get('service_name', 'Unknown')
-        cost = row.get('cost_usd', 0)
+        # Format the run timestamp once for every alert
+        ts_compact = now.strftime('%Y%m%d-%H%M%S')
+        ts_iso = now.isoformat()
         
-        if severity == "CRITICAL":
-            return f"⚠️  IMMEDIATE ACTION REQUIRED: Investigate {service} cost spike of ${cost:.2f}. Check for unauthorized usage, misconfigurations, or runaway processes."
-        elif severity == "HIGH":
-            return f"⚡ HIGH PRIORITY: Review {service} costs. Verify this usage was planned. Consider setting up cost alerts and budget limits."
-        elif severity == "MEDIUM":
-            return f"📊 REVIEW RECOMMENDED: Monitor {service} for continued elevated costs. Document if this is expected seasonal variation."
-        else:
-            return f"ℹ️  FYI: Slight variation in {service} costs detected. No immediate action required but keep monitoring."
+        # Narrow frame holding only the serialized alert fields
+        fields = pd.DataFrame({
+            'alert_id': ("ALERT-" + ts_compact + "-" + anomalies.index.astype(str)).to_numpy(),
+            'timestamp': ts_iso,
+            'severity': severity,
+            'severity_score': severity_score,
+            'date': dates,
+            'service': service,
+            'cost_usd': cost,
+            'average_cost': float(avg_cost),
+            'deviation_pct': deviation_pct,
+            'confidence': confidence,
+            'detection_methods': methods,
+            'anomaly_score': anomaly_score,
+            'zscore': self._column(anomalies, 'zscore', 0.0).astype(float),
+            'if_score': self._column(anomalies, 'if_score', 0.0).astype(float),
+            'iqr_lower': self._column(anomalies, 'iqr_lower', 0.0).astype(float),
+            'iqr_upper': self._column(anomalies, 'iqr_upper', 0.0).astype(float),
+            'recommendation': recommendations
+        })
+        
+        # Walk plain tuples rather than per-row dicts/Series; itertuples
+        # yields native Python scalars of each column's (already cast) dtype
+        rows = fields.itertuples(index=False, name='Row')
+        
+        return [
+            {
+                "alert_id": r.alert_id,
+                "timestamp": r.timestamp,
+                "severity": r.severity,
+                "severity_score": r.severity_score,
+                "date": r.date,
+                "service": r.service,
+                "cost_usd": r.cost_usd,
+                "average_cost": r.average_cost,
+                "deviation_pct": r.deviation_pct,
+                "confidence": r.confidence,
+                "detection_methods": r.detection_methods,
+                "details": {
+                    "anomaly_score": r.anomaly_score,
+                    "zscore": r.zscore,
+                    "if_score": r.if_score,
+                    "iqr_lower": r.iqr_lower,
+                    "iqr_upper": r.iqr_upper
+                },
+                "recommendation": r.recommendation
+            }
+            for r in rows
+        ]
+    
+    @staticmethod
+    def _column(frame: pd.DataFrame, name: str, default) -> np.ndarray:
+        """Get a column as an ndarray, or a constant array when it is missing"""
+        if name in frame.columns:
+            return frame[name].to_numpy()
+        return np.full(len(frame), default)
     
-    def _display_alerts(self, alerts: List[Dict], summary: Dict):
-        """Display alerts in a formatted console output"""
+    def _display_alerts(self, alerts: List[Dict], summary: Dict, severity_counts: Counter, now: datetime):
+        """
+        Display alerts in a formatted console output
+        
+        The report is buffered and written to stdout in one call. Set the
+        FINOPS_QUIET environment variable to skip it entirely.
+        """
+        if os.environ.get('FINOPS_QUIET'):
+            return
+        
+        lines = []
         
-        print("\n" + "="*80)
-        print("🚨 FINOPS ANOMALY DETECTION ALERT REPORT 🚨")
-        print("="*80)
-        print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Total Records Analyzed: {summary.get('total_records', 0)}")
-        print(f"Anomalies Detected: {summary.get('anomaly_count', 0)}")
-        print(f"Detection Rate: {summary.get('anomaly_rate', 0)*100:.2f}%")
-        print(f"Total Cost Analyzed: ${summary.get('total_cost', 0):,.2f}")
-        print(f"Anomalous Cost: ${summary.get('anomaly_cost', 0):,.2f}")
-        print("="*80)
+        lines.append("\n" + "="*80)
+        lines.append("🚨 FINOPS ANOMALY DETECTION ALERT REPORT 🚨")
+        lines.append("="*80)
+        lines.append(f"Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}")
+        lines.append(f"Total Records Analyzed: {summary.get('total_records', 0)}")
+        lines.append(f"Anomalies Detected: {summary.get('anomaly_count', 0)}")
+        lines.append(f"Detection Rate: {summary.get('anomaly_rate', 0)*100:.2f}%")
+        lines.append(f"Total Cost Analyzed: ${summary.get('total_cost', 0):,.2f}")
+        lines.append(f"Anomalous Cost: ${summary.get('anomaly_cost', 0):,.2f}")
+        lines.append("="*80)
         
         if not alerts:
-            print("\n✅ No anomalies detected - all costs within normal range!")
-            print("="*80 + "\n")
+            lines.append("\n✅ No anomalies detected - all costs within normal range!")
+            lines.append("="*80 + "\n")
+            sys.stdout.write("\n".join(lines) + "\n")
             return
         
-        # Group by severity
-        critical = [a for a in alerts if a['severity'] == 'CRITICAL']
-        high = [a for a in alerts if a['severity'] == 'HIGH']
-        medium = [a for a in alerts if a['severity'] == 'MEDIUM']
-        low = [a for a in alerts if a['severity'] == 'LOW']
+        lines.append(f"\n📊 SEVERITY BREAKDOWN:")
+        lines.append(f"   🔴 CRITICAL: {severity_counts['CRITICAL']}")
+        lines.append(f"   🟠 HIGH:     {severity_counts['HIGH']}")
+        lines.append(f"   🟡 MEDIUM:   {severity_counts['MEDIUM']}")
+        lines.append(f"   🟢 LOW:      {severity_counts['LOW']}")
         
-        print(f"\n📊 SEVERITY BREAKDOWN:")
-        print(f"   🔴 CRITICAL: {len(critical)}")
-        print(f"   🟠 HIGH:     {len(high)}")
-        print(f"   🟡 MEDIUM:   {len(medium)}")
-        print(f"   🟢 LOW:      {len(low)}")
-        
-        print("\n" + "-"*80)
-        print("TOP ALERTS (by severity):")
-        print("-"*80)
+        lines.append("\n" + "-"*80)
+        lines.append("TOP ALERTS (by severity):")
+        lines.append("-"*80)
         
         for i, alert in enumerate(alerts[:10], 1):  # Show top 10
-            severity_emoji = {
-                "CRITICAL": "🔴",
-                "HIGH": "🟠",
-                "MEDIUM": "🟡",
-                "LOW": "🟢"
-            }
-            
-            print(f"\n{severity_emoji.get(alert['severity'], '⚪')} Alert #{i}: {alert['alert_id']}")
-            print(f"   Severity: {alert['severity']} (Score: {alert['severity_score']:.2f})")
-            print(f"   Date: {alert['date']}")
-            print(f"   Service: {alert['service']}")
-            print(f"   Cost: ${alert['cost_usd']:,.2f} (Avg: ${alert['average_cost']:,.2f})")
-            print(f"   Deviation: {alert['deviation_pct']:+.1f}%")
-            print(f"   Confidence: {alert['confidence']*100:.0f}%")
-            print(f"   Methods: {', '.join(alert['detection_methods'])}")
-            print(f"   → {alert['recommendation']}")
+            lines.append(f"\n{self.SEVERITY_EMOJI.get(alert['severity'], '⚪')} Alert #{i}: {alert['alert_id']}")
+            lines.append(f"   Severity: {alert['severity']} (Score: {alert['severity_score']:.2f})")
+            lines.append(f"   Date: {alert['date']}")
+            lines.append(f"   Service: {alert['service']}")
+            lines.append(f"   Cost: ${alert['cost_usd']:,.2f} (Avg: ${alert['average_cost']:,.2f})")
+            lines.append(f"   Deviation: {alert['deviation_pct']:+.1f}%")
+            lines.append(f"   Confidence: {alert['confidence']*100:.0f}%")
+            lines.append(f"   Methods: {', '.join(alert['detection_methods'])}")
+            lines.append(f"   → {alert['recommendation']}")
         
         if len(alerts) > 10:
-            print(f"\n... and {len(alerts) - 10} more alerts (see JSON report for full details)")
+            lines.append(f"\n... and {len(alerts) - 10} more alerts (see JSON report for full details)")
         
-        print("\n" + "="*80)
+        lines.append("\n" + "="*80)
         
         # Detection methods summary
         methods_used = summary.get('methods_used', {})
         if methods_used:
-            print("\n🔍 DETECTION METHODS PERFORMANCE:")
+            lines.append("\n🔍 DETECTION METHODS PERFORMANCE:")
             for method, count in methods_used.items():
-                print(f"   - {method.replace('_', ' ').title()}: {count} detections")
+                lines.append(f"   - {method.replace('_', ' ').title()}: {count} detections")
         
         # Per-service breakdown
         if 'by_service' in summary:
-            print("\n📦 ANOMALIES BY SERVICE:")
+            lines.append("\n📦 ANOMALIES BY SERVICE:")
             for service, stats in summary['by_service'].items():
                 if stats['anomaly_count'] > 0:
-                    print(f"   - {service}: {stats['anomaly_count']}/{stats['total_records']} "
+                    lines.append(f"   - {service}: {stats['anomaly_count']}/{stats['total_records']} "
                           f"({stats['anomaly_rate']*100:.1f}%)")
         
-        print("\n" + "="*80 + "\n")
+        lines.append("\n" + "="*80 + "\n")
+        
+        sys.stdout.write("\n".join(lines) + "\n")
     
-    def _save_alerts(self, alerts: List[Dict], summary: Dict):
-        """Save alerts to JSON file"""
-        with tracer.start_as_current_span("save_alerts"):
+    def _save_alerts(
+        self,
+        alerts: List[Dict],
+        summary: Dict,
+        severity_counts: Counter,
+        now: datetime,
+        save_mode: str = 'report'
+    ):
+        """
+        Save alerts to file
+        
+        'report' writes one indented JSON file per run. 'batch' appends a
+        header line plus one line per alert to the daily NDJSON file.
+        """
+        with tracer.start_as_current_span("save_alerts") as span:
+            span.set_attribute("save.mode", save_mode)
             try:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+                
+                severity_distribution = {
+                    severity.lower(): severity_counts[severity]
+                    for severity in self.SEVERITIES
+                }
+                
+                if save_mode == 'batch':
+                    filename = self.output_dir / f"alerts_{now.strftime('%Y%m%d')}.ndjson"
+                    
+                    header = {
+                        "generated_at": now.isoformat(),
+                        "summary": summary,
+                        "alert_count": len(alerts),
+                        "severity_distribution": severity_distribution
+                    }
+                    
+                    lines = [orjson.dumps(header, option=self.NDJSON_OPTIONS)]
+                    lines.extend(orjson.dumps(alert, option=self.NDJSON_OPTIONS) for alert in alerts)
+                    
+                    with open(filename, 'ab') as f:
+                        f.writelines(lines)
+                    
+                    logger.info("💾 Alert batch appended: %s", filename)
+                    print(f"📄 Alerts appended to: {filename}")
+                    return
+                
+                timestamp = now.strftime('%Y%m%d_%H%M%S')
                 filename = self.output_dir / f"alerts_{timestamp}.json"
                 
                 report = {
-                    "generated_at": datetime.now().isoformat(),
+                    "generated_at": now.isoformat(),
                     "summary": summary,
                     "alerts": alerts,
                     "alert_count": len(alerts),
-                    "severity_distribution": {
-                        "critical": sum(1 for a in alerts if a['severity'] == 'CRITICAL'),
-                        "high": sum(1 for a in alerts if a['severity'] == 'HIGH'),
-                        "medium": sum(1 for a in alerts if a['severity'] == 'MEDIUM'),
-                        "low": sum(1 for a in alerts if a['severity'] == 'LOW')
-                    }
+                    "severity_distribution": severity_distribution
                 }
                 
-                with open(filename, 'w') as f:
-                    json.dump(report, f, indent=2)
+                with open(filename, 'wb') as f:
+                    f.write(orjson.dumps(report, option=self.JSON_OPTIONS))
                 
-                logger.info(f"💾 Alert report saved: {filename}")
+                logger.info("💾 Alert report saved: %s", filename)
                 print(f"📄 Full report saved to: {filename}")
                 
             except Exception as e:
-                logger.error(f"❌ Failed to save alerts: {e}")
+                logger.error("❌ Failed to save alerts: %s", e)
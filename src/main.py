@@ -4,6 +4,7 @@ Orchestrates the complete anomaly detection workflow
 """
 import sys
 import os
+import signal
 import logging
 from pathlib import Path
 from datetime import datetime
@@ -116,7 +117,8 @@ def main():
         alerts = alert_gen.generate_alerts(
             data=results,
             summary=summary,
-            save_to_file=True
+            save_to_file=True,
+            avg_cost=float(loader.average_cost)
         )
         
         logger.info(f"✅ Alert generation complete")
@@ -141,12 +143,11 @@ def main():
         print("💡 Prometheus metrics are being exposed at http://localhost:8000/metrics")
         print("   You can scrape these with Prometheus or view them directly.\n")
         
-        # Keep the process alive so metrics can be scraped
+        # Keep the process alive so metrics can be scraped; block in the OS
+        # until a signal arrives (SIGTERM from `docker stop`, SIGINT from Ctrl+C)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
         try:
-            import time
-            while True:
-                time.sleep(60)
-                logger.info("📊 Pipeline is idle, metrics server running...")
+            signal.pause()
         except KeyboardInterrupt:
             logger.info("👋 Shutting down gracefully...")
         
@@ -5,22 +5,93 @@ Uses Isolation Forest and statistical methods to detect cost anomalies
 import pandas as pd
 import numpy as np
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+from joblib import Parallel, delayed, effective_n_jobs
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 from opentelemetry import trace
 
+# Optional GPU backend for Isolation Forest
+try:
+    import cudf
+    from cuml.ensemble import IsolationForest as CumlIsolationForest
+except ImportError:
+    cudf = None
+    CumlIsolationForest = None
+
+# Optional JIT compiler for the z-score + IQR kernel
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from observability.metrics import record_anomaly, processing_duration
+from observability.metrics import record_anomalies_bulk, processing_duration
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 
 
+def _record_step(name: str, flags=None, **attributes):
+    """
+    Add a detection step event to the current (detect_anomalies) span
+    
+    Each step records an event as soon as it finishes, rather than
+    opening a child span; `flags` adds its anomaly count, and falling
+    back to defaults is marked with failed=True.
+    """
+    if flags is not None:
+        attributes["anomalies"] = int(np.sum(flags))
+    trace.get_current_span().add_event(name, attributes)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _statflags(arr, zt_squared, lower, upper):
+        """
+        Z-score and IQR flags in one compiled kernel
+        
+        Takes the squared z-score threshold and precomputed IQR bounds,
+        and fuses the mean/std reductions and both flag passes. Missing
+        (NaN) costs are skipped by the reductions and never flagged.
+        Returns (z_scores, z_mask, iqr_mask, std); when std is 0 the z
+        outputs are meaningless and must be ignored.
+        """
+        n = arr.size
+        
+        total = 0.0
+        count = 0
+        for i in prange(n):
+            if not np.isnan(arr[i]):
+                total += arr[i]
+                count += 1
+        mean = total / count
+        
+        sq = 0.0
+        for i in prange(n):
+            if not np.isnan(arr[i]):
+                sq += (arr[i] - mean) ** 2
+        std = np.sqrt(sq / (count - 1))
+        
+        z_scores = np.empty(n)
+        z_mask = np.empty(n, dtype=np.bool_)
+        iqr_mask = np.empty(n, dtype=np.bool_)
+        var = std * std
+        for i in prange(n):
+            diff = arr[i] - mean
+            z_squared = diff * diff / var if var > 0 else 0.0
+            z_scores[i] = np.sqrt(z_squared)
+            z_mask[i] = z_squared > zt_squared
+            iqr_mask[i] = arr[i] < lower or arr[i] > upper
+        
+        return z_scores, z_mask, iqr_mask, std
+else:
+    _statflags = None
+
+
 class AnomalyDetector:
     """
     Multi-method anomaly detection with full observability
@@ -32,12 +103,20 @@ class AnomalyDetector:
     4. Service-level Analysis - per-service anomaly detection
     """
     
+    # Inputs at least this large are scored in parallel row blocks
+    PARALLEL_SCORING_MIN_ROWS = 100_000
+    
+    # Flag columns produced by the detection methods, in run order
+    ANOMALY_COLUMNS = ('if_anomaly', 'zscore_anomaly', 'iqr_anomaly', 'service_anomaly')
+    
     def __init__(
         self,
         contamination: float = 0.05,
         z_score_threshold: float = 3.0,
         iqr_multiplier: float = 1.5,
-        min_samples: int = 7
+        min_samples: int = 7,
+        use_gpu: bool = False,
+        use_numba: bool = False
     ):
         """
         Initialize the anomaly detector
@@ -47,20 +126,32 @@ class AnomalyDetector:
             z_score_threshold: Number of std deviations for z-score method
             iqr_multiplier: Multiplier for IQR method (1.5 = standard)
             min_samples: Minimum samples required for detection
+            use_gpu: Run Isolation Forest on the GPU via cuML, if installed
+            use_numba: Run z-score and IQR in a compiled Numba kernel, if installed
         """
         self.contamination = contamination
         self.z_score_threshold = z_score_threshold
         self.iqr_multiplier = iqr_multiplier
         self.min_samples = min_samples
+        self.use_gpu = use_gpu and CumlIsolationForest is not None
+        self.use_numba = use_numba and _statflags is not None
+        
         
         # ML Models
         self.isolation_forest = None
-        self.scaler = StandardScaler()
         
         logger.info(f"🤖 Anomaly Detector initialized")
         logger.info(f"   - Contamination: {contamination*100:.1f}%")
         logger.info(f"   - Z-score threshold: {z_score_threshold}")
         logger.info(f"   - IQR multiplier: {iqr_multiplier}")
+        if use_gpu and not self.use_gpu:
+            logger.warning("   ⚠️  cuML not installed, Isolation Forest will run on CPU")
+        elif self.use_gpu:
+            logger.info("   - Isolation Forest backend: GPU (cuML)")
+        if use_numba and not self.use_numba:
+            logger.warning("   ⚠️  Numba not installed, z-score and IQR will run on NumPy")
+        elif self.use_numba:
+            logger.info("   - Z-score/IQR backend: Numba")
     
     @processing_duration.time()
     def detect_anomalies(
@@ -68,7 +159,8 @@ class AnomalyDetector:
         data: pd.DataFrame,
         date_column: str = 'date',
         cost_column: str = 'cost_usd',
-        service_column: str = 'service_name'
+        service_column: str = 'service_name',
+        retrain: bool = False
     ) -> pd.DataFrame:
         """
         Detect anomalies using multiple methods
@@ -78,6 +170,8 @@ class AnomalyDetector:
             date_column: Name of date column
             cost_column: Name of cost column
             service_column: Name of service column
+            retrain: Refit the Isolation Forest even if one is already
+                trained (it is otherwise fit once and reused)
             
         Returns:
             DataFrame with anomaly detection results
@@ -91,32 +185,40 @@ class AnomalyDetector:
                     logger.warning(f"⚠️  Insufficient data: {len(data)} < {self.min_samples} samples")
                     return self._create_empty_results(data)
                 
-                # Add a copy to avoid modifying original
-                results = data.copy()
-                
-                # Method 1: Isolation Forest (Global)
-                logger.info("📊 Method 1: Running Isolation Forest...")
-                results = self._isolation_forest_detection(results, cost_column)
+                costs = data[cost_column].to_numpy()
                 
-                # Method 2: Statistical Z-Score
-                logger.info("📊 Method 2: Running Z-Score analysis...")
-                results = self._zscore_detection(results, cost_column)
+                # Flat windows (idle services, steady reservations) cannot
+                # contain outliers, so skip every method
+                if costs.size == 0 or costs.max() == costs.min():
+                    logger.info("✅ Zero cost variance, no anomalies possible")
+                    return self._create_empty_results(data)
                 
-                # Method 3: IQR Method
-                logger.info("📊 Method 3: Running IQR analysis...")
-                results = self._iqr_detection(results, cost_column)
+                # Methods 1-3: global detection on the cost array. Derived
+                # columns are collected in `out` and joined onto the input
+                # once at the end, instead of copying the whole frame
+                out = self._run_all_statistical(costs, retrain)
                 
                 # Method 4: Service-level analysis (if service column exists)
-                if service_column in results.columns:
+                if service_column in data.columns:
                     logger.info("📊 Method 4: Running per-service analysis...")
-                    results = self._service_level_detection(results, cost_column, service_column)
+                    out.update(self._service_level_detection(data, cost_column, service_column))
                 
                 # Aggregate anomaly flags
-                results = self._aggregate_anomaly_flags(results)
+                out.update(self._aggregate_anomaly_flags(out, len(data)))
+                
+                # Columns from an earlier run are replaced, not duplicated
+                stale = [col for col in out if col in data.columns]
+                base = data.drop(columns=stale) if stale else data
+                results = pd.concat(
+                    [base, pd.DataFrame(out, index=data.index)],
+                    axis=1,
+                    copy=False
+                )
                 
                 # Log summary
-                anomaly_count = results['is_anomaly'].sum()
-                anomaly_cost = results[results['is_anomaly']][cost_column].sum()
+                anomaly_costs = costs[out['is_anomaly']]
+                anomaly_count = anomaly_costs.size
+                anomaly_cost = anomaly_costs.sum()
                 
                 span.set_attribute("detection.anomalies_found", int(anomaly_count))
                 span.set_attribute("detection.anomaly_cost", float(anomaly_cost))
@@ -126,13 +228,12 @@ class AnomalyDetector:
                 logger.info(f"   - Anomaly cost: ${anomaly_cost:,.2f}")
                 logger.info(f"   - Detection rate: {anomaly_count/len(data)*100:.2f}%")
                 
-                # Record metrics for each anomaly
+                # Record metrics for all anomalies in one batch
                 if anomaly_count > 0:
-                    for _, row in results[results['is_anomaly']].iterrows():
-                        record_anomaly(
-                            amount=row[cost_column],
-                            threshold=results[cost_column].mean()
-                        )
+                    record_anomalies_bulk(
+                        amounts=anomaly_costs,
+                        threshold=float(np.nanmean(costs))
+                    )
                 
                 return results
                 
@@ -142,7 +243,98 @@ class AnomalyDetector:
                 span.set_attribute("error.message", str(e))
                 raise
     
-    def _isolation_forest_detection(self, data: pd.DataFrame, cost_column: str) -> pd.DataFrame:
+    def _run_all_statistical(
+        self,
+        costs: np.ndarray,
+        retrain: bool = False
+    ) -> Dict[str, np.ndarray]:
+        """
+        Run the global detection methods back to back on one cost array
+        
+        The cost column is extracted once by the caller and shared by
+        Isolation Forest, z-score and IQR, rather than each method
+        pulling it out of the DataFrame again.
+        
+        Returns:
+            Dictionary of derived columns from all three methods
+        """
+        out = {}
+        
+        # Method 1: Isolation Forest (Global)
+        logger.info("📊 Method 1: Running Isolation Forest...")
+        out.update(self._isolation_forest_detection(costs, retrain))
+        
+        # Methods 2-3: compiled kernel when enabled
+        if self.use_numba:
+            logger.info("📊 Methods 2-3: Running Z-Score and IQR kernel...")
+            kernel_out = self._statflags_detection(costs)
+            if kernel_out is not None:
+                out.update(kernel_out)
+                return out
+        
+        # Method 2: Statistical Z-Score
+        logger.info("📊 Method 2: Running Z-Score analysis...")
+        out.update(self._zscore_detection(costs))
+        
+        # Method 3: IQR Method
+        logger.info("📊 Method 3: Running IQR analysis...")
+        out.update(self._iqr_detection(costs))
+        
+        return out
+    
+    def _statflags_detection(self, costs: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Z-score and IQR detection via the Numba kernel
+        
+        Produces the same columns as _zscore_detection and
+        _iqr_detection. Returns None if the kernel fails, so the
+        caller can fall back to the NumPy methods.
+        """
+        try:
+            # Quartiles from one NumPy partition; sorting inside the
+            # kernel would cost more than the fused passes save
+            Q1, Q3 = np.nanpercentile(costs, [25, 75])
+            IQR = Q3 - Q1
+            lower = Q1 - self.iqr_multiplier * IQR
+            upper = Q3 + self.iqr_multiplier * IQR
+            
+            z_scores, z_mask, iqr_mask, std = _statflags(
+                np.ascontiguousarray(costs, dtype=np.float64),
+                self.z_score_threshold ** 2,
+                lower,
+                upper
+            )
+        except Exception as e:
+            logger.warning(f"   ⚠️  Statistical kernel failed, using NumPy: {e}")
+            _record_step("statflags_kernel", failed=True)
+            return None
+        
+        out = {}
+        if std == 0:
+            logger.warning("   ⚠️  Zero standard deviation, skipping z-score")
+            out['zscore_anomaly'] = False
+            out['zscore'] = 0.0
+            _record_step("zscore_detection", skipped=True)
+        else:
+            out['zscore'] = z_scores
+            out['zscore_anomaly'] = z_mask
+            _record_step("zscore_detection", z_mask)
+        out['iqr_anomaly'] = iqr_mask
+        out['iqr_lower'] = lower
+        out['iqr_upper'] = upper
+        _record_step("iqr_detection", iqr_mask)
+        
+        logger.info(f"   ✓ Z-Score: {np.sum(out['zscore_anomaly'])} anomalies")
+        logger.info(f"   ✓ IQR: {iqr_mask.sum()} anomalies")
+        logger.info(f"      Range: [${lower:.2f}, ${upper:.2f}]")
+        
+        return out
+    
+    def _isolation_forest_detection(
+        self,
+        costs: np.ndarray,
+        retrain: bool = False
+    ) -> Dict[str, np.ndarray]:
         """
         Use Isolation Forest (unsupervised ML) to detect anomalies
         
@@ -150,185 +342,253 @@ class AnomalyDetector:
         - Building random trees that isolate observations
         - Anomalies are easier to isolate (shorter paths)
         - Perfect for high-dimensional data without labels
+        
+        The fitted model is kept and reused on later calls; it is only
+        trained on the first call or when `retrain` is set.
         """
-        with tracer.start_as_current_span("isolation_forest"):
+        try:
+            # Prepare features; no scaling needed, as the trees' random
+            # axis-aligned splits are invariant to affine rescaling.
+            # The trees compare in float32, so convert once up front
+            # rather than having sklearn copy on every fit and score
+            X = costs.astype(np.float32, copy=False).reshape(-1, 1)
+            
+            if self.isolation_forest is None or retrain:
+                self._fit_if(X)
+            
+            is_anomaly, scores = self._predict_if(X)
+            
+            logger.info(f"   ✓ Isolation Forest: {is_anomaly.sum()} anomalies")
+            _record_step("isolation_forest", is_anomaly)
+            
+            return {'if_anomaly': is_anomaly, 'if_score': scores}
+            
+        except Exception as e:
+            logger.warning(f"   ⚠️  Isolation Forest failed: {e}")
+            _record_step("isolation_forest", failed=True)
+            return {'if_anomaly': False, 'if_score': 0.0}
+    
+    def _fit_if(self, X: np.ndarray):
+        """Train the Isolation Forest, on the GPU when enabled"""
+        # Each tree is built on a subsample of at most 256 points, so
+        # training cost does not grow with N
+        max_samples = min(256, len(X))
+        
+        if self.use_gpu:
             try:
-                # Prepare features
-                X = data[[cost_column]].values
-                
-                # Scale the data
-                X_scaled = self.scaler.fit_transform(X)
-                
-                # Train Isolation Forest
-                self.isolation_forest = IsolationForest(
+                model = CumlIsolationForest(
                     contamination=self.contamination,
                     random_state=42,
-                    n_estimators=100
+                    n_estimators=100,
+                    max_samples=max_samples
                 )
-                
-                # Predict (-1 for anomalies, 1 for normal)
-                predictions = self.isolation_forest.fit_predict(X_scaled)
-                
-                # Get anomaly scores (lower = more anomalous)
-                scores = self.isolation_forest.score_samples(X_scaled)
-                
-                data['if_anomaly'] = predictions == -1
-                data['if_score'] = scores
-                
-                logger.info(f"   ✓ Isolation Forest: {data['if_anomaly'].sum()} anomalies")
-                
-                return data
-                
+                model.fit(cudf.DataFrame({'cost': X[:, 0]}))
+                self.isolation_forest = model
+                return
             except Exception as e:
-                logger.warning(f"   ⚠️  Isolation Forest failed: {e}")
-                data['if_anomaly'] = False
-                data['if_score'] = 0.0
-                return data
+                logger.warning(f"   ⚠️  GPU Isolation Forest failed, using CPU: {e}")
+        
+        model = IsolationForest(
+            contamination=self.contamination,
+            random_state=42,
+            n_estimators=100,
+            max_samples=max_samples,
+            n_jobs=-1
+        )
+        model.fit(X)
+        self.isolation_forest = model
     
-    def _zscore_detection(self, data: pd.DataFrame, cost_column: str) -> pd.DataFrame:
+    def _predict_if(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score samples with the fitted Isolation Forest
+        
+        Returns:
+            Tuple of (anomaly flags, anomaly scores; lower = more anomalous)
+        """
+        # A non-sklearn model can only be the cuML one from _fit_if
+        if not isinstance(self.isolation_forest, IsolationForest):
+            X_gpu = cudf.DataFrame({'cost': X[:, 0]})
+            predictions = self.isolation_forest.predict(X_gpu).to_numpy()
+            scores = self.isolation_forest.score_samples(X_gpu).to_numpy()
+            return predictions == -1, scores
+        
+        scores = self._score_samples(X)
+        
+        # Same rule as predict(), without scoring every point twice
+        return (scores - self.isolation_forest.offset_) < 0, scores
+    
+    def _score_samples(self, X: np.ndarray) -> np.ndarray:
+        """
+        Score samples with the fitted Isolation Forest
+        
+        Large inputs are split into row blocks scored on a thread pool;
+        tree traversal releases the GIL, so blocks run in parallel.
+        """
+        if len(X) < self.PARALLEL_SCORING_MIN_ROWS:
+            return self.isolation_forest.score_samples(X)
+        
+        # Never more blocks than rows: empty blocks make score_samples raise
+        n_blocks = min(len(X), effective_n_jobs(-1) * 4)
+        blocks = np.array_split(X, n_blocks)
+        scores = Parallel(n_jobs=-1, prefer='threads')(
+            delayed(self.isolation_forest.score_samples)(block) for block in blocks
+        )
+        return np.concatenate(scores)
+    
+    def _zscore_detection(self, costs: np.ndarray) -> Dict[str, np.ndarray]:
         """
         Statistical Z-Score method
         
         Z-score = (x - mean) / std
         Points with |z-score| > threshold are anomalies
         """
-        with tracer.start_as_current_span("zscore_detection"):
-            try:
-                costs = data[cost_column]
+        try:
+            # Plain NumPy reductions on the raw array; the NaN-skipping
+            # ones (as pandas used) are slower, so only for missing costs
+            if np.isnan(costs).any():
+                mean = np.nanmean(costs)
+                std = np.nanstd(costs, ddof=1)
+            else:
                 mean = costs.mean()
-                std = costs.std()
-                
-                if std == 0:
-                    logger.warning("   ⚠️  Zero standard deviation, skipping z-score")
-                    data['zscore_anomaly'] = False
-                    data['zscore'] = 0.0
-                    return data
-                
-                # Calculate z-scores
-                z_scores = np.abs((costs - mean) / std)
-                
-                data['zscore'] = z_scores
-                data['zscore_anomaly'] = z_scores > self.z_score_threshold
-                
-                logger.info(f"   ✓ Z-Score: {data['zscore_anomaly'].sum()} anomalies")
-                
-                return data
-                
-            except Exception as e:
-                logger.warning(f"   ⚠️  Z-Score failed: {e}")
-                data['zscore_anomaly'] = False
-                data['zscore'] = 0.0
-                return data
+                std = costs.std(ddof=1)
+            
+            if std == 0:
+                logger.warning("   ⚠️  Zero standard deviation, skipping z-score")
+                _record_step("zscore_detection", skipped=True)
+                return {'zscore_anomaly': False, 'zscore': 0.0}
+            
+            # Compare squared z-scores against the squared threshold,
+            # which needs no abs pass; the sqrt is only for the stored score
+            diff = costs - mean
+            z_squared = diff * diff / (std * std)
+            zscore_anomaly = z_squared > self.z_score_threshold ** 2
+            z_scores = np.sqrt(z_squared)
+            
+            logger.info(f"   ✓ Z-Score: {zscore_anomaly.sum()} anomalies")
+            _record_step("zscore_detection", zscore_anomaly)
+            
+            return {'zscore': z_scores, 'zscore_anomaly': zscore_anomaly}
+            
+        except Exception as e:
+            logger.warning(f"   ⚠️  Z-Score failed: {e}")
+            _record_step("zscore_detection", failed=True)
+            return {'zscore_anomaly': False, 'zscore': 0.0}
     
-    def _iqr_detection(self, data: pd.DataFrame, cost_column: str) -> pd.DataFrame:
+    def _iqr_detection(self, costs: np.ndarray) -> Dict[str, np.ndarray]:
         """
         Interquartile Range (IQR) method
         
         IQR = Q3 - Q1
         Outliers are outside [Q1 - 1.5*IQR, Q3 + 1.5*IQR]
         """
-        with tracer.start_as_current_span("iqr_detection"):
-            try:
-                costs = data[cost_column]
-                
-                Q1 = costs.quantile(0.25)
-                Q3 = costs.quantile(0.75)
-                IQR = Q3 - Q1
-                
-                lower_bound = Q1 - self.iqr_multiplier * IQR
-                upper_bound = Q3 + self.iqr_multiplier * IQR
-                
-                data['iqr_anomaly'] = (costs < lower_bound) | (costs > upper_bound)
-                data['iqr_lower'] = lower_bound
-                data['iqr_upper'] = upper_bound
-                
-                logger.info(f"   ✓ IQR: {data['iqr_anomaly'].sum()} anomalies")
-                logger.info(f"      Range: [${lower_bound:.2f}, ${upper_bound:.2f}]")
-                
-                return data
-                
-            except Exception as e:
-                logger.warning(f"   ⚠️  IQR failed: {e}")
-                data['iqr_anomaly'] = False
-                return data
+        try:
+            # Both quartiles from a single partition of the raw array;
+            # missing costs are skipped, as Series.quantile did
+            Q1, Q3 = np.nanpercentile(costs, [25, 75])
+            IQR = Q3 - Q1
+            
+            lower_bound = Q1 - self.iqr_multiplier * IQR
+            upper_bound = Q3 + self.iqr_multiplier * IQR
+            
+            iqr_anomaly = (costs < lower_bound) | (costs > upper_bound)
+            
+            logger.info(f"   ✓ IQR: {iqr_anomaly.sum()} anomalies")
+            logger.info(f"      Range: [${lower_bound:.2f}, ${upper_bound:.2f}]")
+            _record_step("iqr_detection", iqr_anomaly)
+            
+            return {
+                'iqr_anomaly': iqr_anomaly,
+                'iqr_lower': lower_bound,
+                'iqr_upper': upper_bound
+            }
+            
+        except Exception as e:
+            logger.warning(f"   ⚠️  IQR failed: {e}")
+            _record_step("iqr_detection", failed=True)
+            return {'iqr_anomaly': False}
     
     def _service_level_detection(
         self,
         data: pd.DataFrame,
         cost_column: str,
         service_column: str
-    ) -> pd.DataFrame:
+    ) -> Dict[str, np.ndarray]:
         """
         Per-service anomaly detection
         
         Detects anomalies within each service independently
         More granular than global detection
         """
-        with tracer.start_as_current_span("service_level_detection"):
-            try:
-                data['service_anomaly'] = False
-                
-                for service in data[service_column].unique():
-                    service_data = data[data[service_column] == service]
-                    
-                    if len(service_data) < self.min_samples:
-                        continue
-                    
-                    # Calculate service-specific statistics
-                    service_costs = service_data[cost_column]
-                    service_mean = service_costs.mean()
-                    service_std = service_costs.std()
-                    
-                    if service_std == 0:
-                        continue
-                    
-                    # Z-score within service
-                    service_z = np.abs((service_costs - service_mean) / service_std)
-                    service_anomalies = service_z > self.z_score_threshold
-                    
-                    # Update main dataframe
-                    data.loc[service_data.index, 'service_anomaly'] = service_anomalies.values
-                
-                logger.info(f"   ✓ Service-level: {data['service_anomaly'].sum()} anomalies")
-                
-                return data
-                
-            except Exception as e:
-                logger.warning(f"   ⚠️  Service-level failed: {e}")
-                data['service_anomaly'] = False
-                return data
+        try:
+            # Service-specific statistics, broadcast back to every row
+            grouped = data.groupby(service_column, observed=True, sort=False)[cost_column]
+            service_mean = grouped.transform('mean')
+            service_std = grouped.transform('std')
+            service_count = grouped.transform('size')
+            
+            # Squared z-score within service; zero-variance services are
+            # never flagged
+            service_z_squared = (
+                (data[cost_column] - service_mean) / service_std.replace(0, np.nan)
+            ) ** 2
+            
+            # Services with too few samples are skipped
+            service_anomaly = (
+                (service_z_squared > self.z_score_threshold ** 2)
+                & (service_count >= self.min_samples)
+            ).to_numpy()
+            
+            logger.info(f"   ✓ Service-level: {service_anomaly.sum()} anomalies")
+            _record_step("service_level_detection", service_anomaly)
+            
+            return {'service_anomaly': service_anomaly}
+            
+        except Exception as e:
+            logger.warning(f"   ⚠️  Service-level failed: {e}")
+            _record_step("service_level_detection", failed=True)
+            return {'service_anomaly': False}
     
-    def _aggregate_anomaly_flags(self, data: pd.DataFrame) -> pd.DataFrame:
+    def _aggregate_anomaly_flags(
+        self,
+        flags: Dict[str, np.ndarray],
+        n_rows: int
+    ) -> Dict[str, np.ndarray]:
         """
         Aggregate anomaly flags from multiple methods
         
+        `flags` holds the derived columns from each detection method;
+        failed methods contribute a scalar False
+        
         A point is considered an anomaly if detected by 2+ methods
         This reduces false positives while maintaining sensitivity
         """
-        with tracer.start_as_current_span("aggregate_flags"):
-            # Count how many methods flagged each point
-            anomaly_columns = [
-                col for col in data.columns
-                if col.endswith('_anomaly')
-            ]
-            
-            data['anomaly_score'] = data[anomaly_columns].sum(axis=1)
-            
-            # Require 2+ methods to agree (consensus approach)
-            data['is_anomaly'] = data['anomaly_score'] >= 2
-            
+        # Count how many methods flagged each point
+        # (service_anomaly is absent when there is no service column)
+        anomaly_columns = [col for col in self.ANOMALY_COLUMNS if col in flags]
+        
+        # Stack the boolean flags as uint8 and sum without float promotion
+        stacked = np.column_stack([
+            np.broadcast_to(np.asarray(flags[col], dtype=np.uint8), n_rows)
+            for col in anomaly_columns
+        ])
+        score = stacked.sum(axis=1, dtype=np.uint8)
+        
+        # Require 2+ methods to agree (consensus approach)
+        is_anomaly = score >= 2
+        _record_step("aggregate_flags", is_anomaly)
+        
+        return {
+            'anomaly_score': score,
+            'is_anomaly': is_anomaly,
             # Add confidence level
-            data['confidence'] = data['anomaly_score'] / len(anomaly_columns)
-            
-            return data
+            'confidence': score / len(anomaly_columns)
+        }
     
     def _create_empty_results(self, data: pd.DataFrame) -> pd.DataFrame:
         """Create empty results when detection can't run"""
         results = data.copy()
-        results['if_anomaly'] = False
-        results['zscore_anomaly'] = False
-        results['iqr_anomaly'] = False
-        results['service_anomaly'] = False
+        for col in self.ANOMALY_COLUMNS:
+            results[col] = False
         results['is_anomaly'] = False
         results['anomaly_score'] = 0
         results['confidence'] = 0.0
@@ -366,15 +626,12 @@ class AnomalyDetector:
             
             # Add per-service breakdown if available
             if 'service_name' in data.columns:
-                service_summary = {}
-                for service in data['service_name'].unique():
-                    service_data = data[data['service_name'] == service]
-                    service_anomalies = service_data[service_data['is_anomaly']]
-                    service_summary[service] = {
-                        "total_records": len(service_data),
-                        "anomaly_count": len(service_anomalies),
-                        "anomaly_rate": len(service_anomalies) / len(service_data) if len(service_data) > 0 else 0
-                    }
-                summary["by_service"] = service_summary
+                # One grouped pass instead of two boolean slices per service
+                grouped = data.groupby('service_name', observed=True, sort=False)['is_anomaly']
+                service_summary = grouped.agg(total_records='size', anomaly_count='sum')
+                service_summary['anomaly_rate'] = (
+                    service_summary['anomaly_count'] / service_summary['total_records']
+                )
+                summary["by_service"] = service_summary.to_dict(orient='index')
             
             return summary
@@ -3,6 +3,7 @@ Observability Metrics Setup
 Configures OpenTelemetry and Prometheus for the entire pipeline
 """
 import logging
+import numpy as np
 from prometheus_client import Counter, Histogram, Gauge, start_http_server
 from opentelemetry import trace, metrics as otel_metrics
 from opentelemetry.sdk.trace import TracerProvider
@@ -32,6 +33,12 @@ anomaly_amount_gauge = Gauge(
     'Dollar amount of detected anomaly'
 )
 
+anomaly_amount_histogram = Histogram(
+    'finops_anomaly_amount_usd_distribution',
+    'Distribution of anomaly amounts',
+    buckets=[10, 100, 1000, 10000, 100000]
+)
+
 processing_duration = Histogram(
     'finops_processing_duration_seconds',
     'Time spent processing cost data',
@@ -90,9 +97,24 @@ def record_ingestion(count: int):
 def record_anomaly(amount: float, threshold: float):
     """Record anomaly detection metrics"""
     anomaly_detection_counter.inc()
+    anomaly_amount_histogram.observe(amount)
     anomaly_amount_gauge.set(amount)
     logger.warning(f"🚨 Anomaly detected! Amount: ${amount:.2f} (threshold: ${threshold:.2f})")
 
+def record_anomalies_bulk(amounts: np.ndarray, threshold: float):
+    """Record detection metrics for a batch of anomalies at once"""
+    if amounts.size == 0:
+        return
+    anomaly_detection_counter.inc(amounts.size)
+    for amount in amounts.tolist():
+        anomaly_amount_histogram.observe(amount)
+    # The gauge only holds the latest amount, so set it once per batch
+    anomaly_amount_gauge.set(float(amounts[-1]))
+    logger.warning(
+        "🚨 %d anomalies detected! Max amount: $%.2f (threshold: $%.2f)",
+        amounts.size, amounts.max(), threshold
+    )
+
 def record_cost_analyzed(total_cost: float):
     """Record total cost analyzed"""
     cost_analyzed_gauge.set(total_cost)
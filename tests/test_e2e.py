@@ -1,6 +1,7 @@
 """
 End-to-End Tests for FinOps AI Observability POC
 """
+import json
 import pytest
 import pandas as pd
 import numpy as np
@@ -44,6 +45,70 @@ class TestDataIngestion:
         assert 'cost_usd' in result.columns
         assert result['cost_usd'].sum() > 0
     
+    def test_load_unsorted_data(self, tmp_path):
+        """Test that out-of-order records are sorted by date"""
+        test_data = pd.DataFrame({
+            'date': ['2025-01-03', '2025-01-01', '2025-01-02'],
+            'service_name': ['EC2'] * 3,
+            'cost_usd': [103, 101, 102]
+        })
+        
+        test_file = tmp_path / "test_unsorted.csv"
+        test_data.to_csv(test_file, index=False)
+        
+        loader = CostDataLoader(str(test_file), cost_column='cost_usd')
+        result = loader.load_data()
+        
+        assert result['date'].is_monotonic_increasing
+        assert list(result['cost_usd']) == [101, 102, 103]
+        assert list(result.index) == [0, 1, 2]
+        assert result.attrs['sorted_by'] == 'date'
+    
+    @pytest.mark.parametrize('freq', ['D', 'h'])
+    def test_load_data_chunked(self, tmp_path, freq):
+        """Test that chunked loading matches a single-pass load"""
+        test_data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=25, freq=freq),
+            'service_name': ['EC2', 'RDS', 'S3', 'Lambda', 'EC2'] * 5,
+            'cost_usd': [100 + i for i in range(25)]
+        })
+        
+        test_file = tmp_path / "test_costs.csv"
+        test_data.to_csv(test_file, index=False)
+        
+        single = CostDataLoader(str(test_file), cost_column='cost_usd').load_data()
+        chunked = CostDataLoader(str(test_file), cost_column='cost_usd', chunksize=7).load_data()
+        
+        assert single['date'].dtype == 'datetime64[ns]'
+        pd.testing.assert_frame_equal(chunked, single)
+    
+    def test_summary_stats(self, tmp_path):
+        """Test summary statistics of loaded data"""
+        test_data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=5),
+            'service_name': ['EC2'] * 5,
+            'cost_usd': [10, 20, 30, 40, 50]
+        })
+        
+        test_file = tmp_path / "test_costs.csv"
+        test_data.to_csv(test_file, index=False)
+        
+        loader = CostDataLoader(str(test_file), cost_column='cost_usd')
+        loader.load_data()
+        stats = loader.get_summary_stats()
+        
+        assert loader.average_cost == 30
+        
+        assert stats['total_records'] == 5
+        assert stats['total_cost'] == 150
+        assert stats['average_cost'] == 30
+        assert stats['median_cost'] == 30
+        assert stats['min_cost'] == 10
+        assert stats['max_cost'] == 50
+        assert stats['std_dev'] == pytest.approx(np.std([10, 20, 30, 40, 50], ddof=1))
+        assert str(stats['date_range_start']) == '2025-01-01'
+        assert str(stats['date_range_end']) == '2025-01-05'
+    
     def test_load_missing_file(self):
         """Test handling of missing file"""
         loader = CostDataLoader(data_path="nonexistent.csv")
@@ -117,6 +182,186 @@ class TestAnomalyDetection:
         # Should detect few or no anomalies
         assert results['is_anomaly'].sum() <= len(data) * 0.1
     
+    def test_zero_variance_short_circuit(self):
+        """Test that flat cost data skips detection entirely"""
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=30),
+            'service_name': ['EC2'] * 30,
+            'cost_usd': [100.0] * 30
+        })
+        
+        detector = AnomalyDetector()
+        results = detector.detect_anomalies(data)
+        
+        assert results['is_anomaly'].sum() == 0
+        assert detector.isolation_forest is None
+    
+    @pytest.mark.parametrize('use_numba', [False, True])
+    def test_detection_with_missing_cost(self, use_numba):
+        """Test that one NaN cost does not disable z-score detection"""
+        if use_numba:
+            pytest.importorskip("numba")
+        costs = np.random.default_rng(0).gamma(2, 50, 300)
+        costs[[50, 150, 250]] = 5000.0
+        costs[10] = np.nan
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=300),
+            'service_name': ['EC2'] * 300,
+            'cost_usd': costs
+        })
+        
+        results = AnomalyDetector(use_numba=use_numba).detect_anomalies(data)
+        
+        assert results['zscore_anomaly'].iloc[[50, 150, 250]].all()
+        assert not results['zscore_anomaly'].iloc[10]
+        assert results['is_anomaly'].iloc[[50, 150, 250]].all()
+    
+    def test_iqr_ignores_missing_costs(self):
+        """Test that a NaN cost does not disable IQR detection"""
+        costs = np.random.default_rng(0).gamma(2, 50, 300)
+        costs[[50, 150, 250]] = 5000.0
+        
+        costs[10] = np.nan
+        
+        result = AnomalyDetector()._iqr_detection(costs)
+        
+        assert np.isfinite(result['iqr_lower']) and np.isfinite(result['iqr_upper'])
+        assert result['iqr_anomaly'][[50, 150, 250]].all()
+        assert not result['iqr_anomaly'][10]
+    
+    def test_parallel_scoring_matches_serial(self):
+        """Test that block-parallel Isolation Forest scoring matches serial"""
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=200),
+            'service_name': ['EC2'] * 200,
+            'cost_usd': np.random.default_rng(0).gamma(2, 50, 200)
+        })
+        
+        serial = AnomalyDetector().detect_anomalies(data)
+        
+        detector = AnomalyDetector()
+        detector.PARALLEL_SCORING_MIN_ROWS = 0
+        parallel = detector.detect_anomalies(data)
+        
+        np.testing.assert_allclose(parallel['if_score'], serial['if_score'])
+        assert (parallel['if_anomaly'] == serial['if_anomaly']).all()
+    
+    def test_parallel_scoring_more_workers_than_rows(self, monkeypatch):
+        """Test that block scoring never produces empty blocks"""
+        import ml_detector.detector as detector_module
+        monkeypatch.setattr(detector_module, 'effective_n_jobs', lambda n_jobs: 64)
+        
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=200),
+            'service_name': ['EC2'] * 200,
+            'cost_usd': np.random.default_rng(0).gamma(2, 50, 200)
+        })
+        
+        serial = AnomalyDetector().detect_anomalies(data)
+        
+        detector = AnomalyDetector()
+        detector.PARALLEL_SCORING_MIN_ROWS = 0
+        parallel = detector.detect_anomalies(data)
+        
+        np.testing.assert_allclose(parallel['if_score'], serial['if_score'])
+        assert (parallel['if_score'] != 0).all()
+    
+    def test_isolation_forest_reused_across_calls(self):
+        """Test that the Isolation Forest is fit once unless retraining"""
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=30),
+            'service_name': ['EC2'] * 30,
+            'cost_usd': [100] * 29 + [1000]
+        })
+        
+        detector = AnomalyDetector(contamination=0.1)
+        detector.detect_anomalies(data)
+        model = detector.isolation_forest
+        
+        results = detector.detect_anomalies(data)
+        assert detector.isolation_forest is model
+        assert results.iloc[-1]['if_anomaly'] == True
+        
+        detector.detect_anomalies(data, retrain=True)
+        assert detector.isolation_forest is not model
+    
+    def test_statflags_kernel_matches_numpy(self):
+        """Test that the Numba kernel agrees with the NumPy methods"""
+        pytest.importorskip("numba")
+        costs = np.random.default_rng(0).gamma(2, 50, 1000)
+        costs[::50] *= 15
+        
+        detector = AnomalyDetector(use_numba=True)
+        assert detector.use_numba
+        kernel = detector._statflags_detection(costs)
+        expected = {**detector._zscore_detection(costs), **detector._iqr_detection(costs)}
+        
+        assert kernel.keys() == expected.keys()
+        for col in ('zscore', 'iqr_lower', 'iqr_upper'):
+            np.testing.assert_allclose(kernel[col], expected[col])
+        for col in ('zscore_anomaly', 'iqr_anomaly'):
+            assert (kernel[col] == expected[col]).all()
+    
+    def test_detection_leaves_input_unchanged(self):
+        """Test that results are a new frame and the input is not mutated"""
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=30),
+            'service_name': ['EC2'] * 30,
+            'cost_usd': [100] * 29 + [1000]
+        })
+        columns = list(data.columns)
+        
+        detector = AnomalyDetector(contamination=0.1)
+        results = detector.detect_anomalies(data)
+        
+        assert list(data.columns) == columns
+        assert list(results.columns[:len(columns)]) == columns
+        
+        # Re-running on results replaces the derived columns
+        rerun = detector.detect_anomalies(results)
+        assert rerun.columns.is_unique
+        assert list(rerun.columns) == list(results.columns)
+    
+    def test_detection_span_events(self, monkeypatch):
+        """Test that each detection step records an event on the span"""
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        import ml_detector.detector as detector_module
+        
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        monkeypatch.setattr(detector_module, 'tracer', provider.get_tracer(__name__))
+        
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=30),
+            'service_name': ['EC2'] * 30,
+            'cost_usd': [100 + i % 3 for i in range(29)] + [1000]
+        })
+        
+        detector = AnomalyDetector(contamination=0.1)
+        results = detector.detect_anomalies(data)
+        
+        span, = exporter.get_finished_spans()
+        events = {event.name: dict(event.attributes) for event in span.events}
+        assert [event.name for event in span.events] == [
+            'isolation_forest', 'zscore_detection', 'iqr_detection',
+            'service_level_detection', 'aggregate_flags'
+        ]
+        assert events['isolation_forest'] == {'anomalies': int(results['if_anomaly'].sum())}
+        assert events['zscore_detection'] == {'anomalies': int(results['zscore_anomaly'].sum())}
+        assert events['aggregate_flags'] == {'anomalies': int(results['is_anomaly'].sum())}
+        
+        # A method falling back to defaults is marked as failed
+        exporter.clear()
+        monkeypatch.setattr(detector, '_predict_if', lambda X: 1 / 0)
+        detector.detect_anomalies(data)
+        
+        span, = exporter.get_finished_spans()
+        assert span.events[0].name == 'isolation_forest'
+        assert dict(span.events[0].attributes) == {'failed': True}
+    
     def test_insufficient_data(self):
         """Test handling of insufficient data"""
         data = pd.DataFrame({
@@ -173,7 +418,9 @@ class TestAlertGeneration:
         """Test alert generator initialization"""
         alert_gen = AlertGenerator(output_dir=str(tmp_path / "alerts"))
         
-        assert alert_gen.output_dir.exists()
+        assert alert_gen.output_dir == tmp_path / "alerts"
+        # Output directory is only created once alerts are saved
+        assert not alert_gen.output_dir.exists()
     
     def test_generate_alerts_with_anomalies(self, tmp_path):
         """Test alert generation with anomalies"""
@@ -196,10 +443,89 @@ class TestAlertGeneration:
         alerts = alert_gen.generate_alerts(data, summary, save_to_file=True)
         
         assert len(alerts) == 1
+        assert alert_gen.output_dir.exists()
         assert alerts[0]['severity'] in ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
         assert 'alert_id' in alerts[0]
         assert 'recommendation' in alerts[0]
     
+    def test_alert_field_types(self, tmp_path):
+        """Test that alert fields keep float/int types for integer cost data"""
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=10),
+            'service_name': ['EC2'] * 10,
+            'cost_usd': [100] * 9 + [500],
+            'is_anomaly': [False] * 9 + [True],
+            'confidence': [0.0] * 9 + [0.9],
+            'anomaly_score': [0] * 9 + [3]
+        })
+        
+        alert_gen = AlertGenerator(output_dir=str(tmp_path / "alerts"))
+        alert = alert_gen.generate_alerts(data, {}, save_to_file=False)[0]
+        
+        for field in ('severity_score', 'cost_usd', 'average_cost', 'deviation_pct', 'confidence'):
+            assert type(alert[field]) is float, field
+        for field in ('zscore', 'if_score', 'iqr_lower', 'iqr_upper'):
+            assert type(alert['details'][field]) is float, field
+        assert type(alert['details']['anomaly_score']) is int
+        assert alert['cost_usd'] == 500.0
+    
+    def test_alert_date_format(self, tmp_path):
+        """Test that alert dates keep the full timestamp format in saved output"""
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=10),
+            'service_name': ['EC2'] * 10,
+            'cost_usd': [100.0] * 9 + [500.0],
+            'is_anomaly': [False] * 9 + [True],
+            'confidence': [0.0] * 9 + [0.9],
+            'anomaly_score': [0] * 9 + [3]
+        })
+        
+        alert_gen = AlertGenerator(output_dir=str(tmp_path / "alerts"))
+        alerts = alert_gen.generate_alerts(data, {}, save_to_file=True)
+        
+        assert alerts[0]['date'] == '2025-01-10 00:00:00'
+        
+        report = json.loads(next(alert_gen.output_dir.glob('*.json')).read_text())
+        assert report['alerts'][0]['date'] == '2025-01-10 00:00:00'
+    
+    def test_generate_alerts_batch_mode(self, tmp_path):
+        """Test appending alerts to the daily NDJSON batch file"""
+        data = pd.DataFrame({
+            'date': pd.date_range('2025-01-01', periods=10),
+            'service_name': ['EC2'] * 10,
+            'cost_usd': [100] * 9 + [500],
+            'is_anomaly': [False] * 9 + [True],
+            'confidence': [0.0] * 9 + [0.9],
+            'anomaly_score': [0] * 9 + [3]
+        })
+        
+        summary = {
+            'total_records': 10,
+            'anomaly_count': 1,
+            'anomaly_rate': 0.1
+        }
+        
+        alert_gen = AlertGenerator(output_dir=str(tmp_path / "alerts"))
+        alert_gen.generate_alerts(data, summary, save_mode='batch')
+        alert_gen.generate_alerts(data, summary, save_mode='batch')
+        
+        batch_files = list(alert_gen.output_dir.glob("*.ndjson"))
+        assert len(batch_files) == 1
+        
+        records = [json.loads(line) for line in batch_files[0].read_text().splitlines()]
+        assert len(records) == 4  # header + alert, per run
+        assert records[0]['alert_count'] == 1
+        assert records[1]['service'] == 'EC2'
+    
+    def test_generate_alerts_invalid_save_mode(self, tmp_path):
+        """Test rejection of unknown save modes"""
+        data = pd.DataFrame({'cost_usd': [100], 'is_anomaly': [True]})
+        
+        alert_gen = AlertGenerator(output_dir=str(tmp_path / "alerts"))
+        
+        with pytest.raises(ValueError):
+            alert_gen.generate_alerts(data, {}, save_mode='stream')
+    
     def test_generate_alerts_no_anomalies(self, tmp_path):
         """Test alert generation with no anomalies"""
         data = pd.DataFrame({
@@ -221,6 +547,30 @@ class TestAlertGeneration:
         assert len(alerts) == 0
 
 
+class TestObservability:
+    """Test observability metrics"""
+    
+    def test_record_anomalies_bulk(self):
+        """Test batch anomaly metric recording"""
+        from prometheus_client import REGISTRY
+        from observability.metrics import record_anomalies_bulk
+        
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0.0
+        
+        bucket = {'le': '1000.0'}
+        before = sample('finops_anomalies_detected_total')
+        before_count = sample('finops_anomaly_amount_usd_distribution_count')
+        before_bucket = sample('finops_anomaly_amount_usd_distribution_bucket', **bucket)
+        record_anomalies_bulk(np.array([500.0, 300.0]), threshold=100.0)
+        after = sample('finops_anomalies_detected_total')
+        
+        assert after - before == 2
+        assert sample('finops_anomaly_amount_usd_distribution_count') - before_count == 2
+        assert sample('finops_anomaly_amount_usd_distribution_bucket', **bucket) - before_bucket == 2
+        assert REGISTRY.get_sample_value('finops_anomaly_amount_usd') == 300.0
+
+
 class TestEndToEnd:
     """End-to-end integration tests"""
     